@@ -1,15 +1,28 @@
-from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.concurrency import run_in_threadpool
+from google.api_core import exceptions as gcs_exceptions
 from .models import NotePayload
 from datetime import datetime, timezone
+import asyncio
+import gzip
+import hashlib
+import orjson
 import os
 import secrets
+import time
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from . import storage
 
 app = FastAPI(title="Personal Notes API", version="v1")
 
+# Compress larger responses (note content, the index tree). Level 1 keeps the
+# CPU cost negligible while still shrinking Markdown/JSON several times over.
+_GZIP_MINIMUM_SIZE = 1024
+app.add_middleware(GZipMiddleware, minimum_size=_GZIP_MINIMUM_SIZE, compresslevel=1)
+
 NOTES_API_KEY = os.environ.get("NOTES_API_KEY")
 NOTES_BUCKET = os.environ.get("NOTES_BUCKET")
 
@@ -18,11 +31,39 @@ if not NOTES_API_KEY:
 if not NOTES_BUCKET:
     raise RuntimeError("NOTES_BUCKET env var not set")
 
+_MIN_API_KEY_LENGTH = 32
+if len(NOTES_API_KEY) < _MIN_API_KEY_LENGTH:
+    raise RuntimeError(f"NOTES_API_KEY must be at least {_MIN_API_KEY_LENGTH} characters")
+
+# Encoded once so per-request auth only has to encode the header
+_NOTES_API_KEY_BYTES = NOTES_API_KEY.encode("utf-8")
+
+
+def _auth_ok(x_notes_key: Optional[str]) -> bool:
+    """Constant-time check of the X-Notes-Key header against the configured key."""
+    # A header of the wrong length can never match; skip encoding it. The key
+    # length is not secret (compare_digest leaks it too).
+    if not x_notes_key or len(x_notes_key) != len(NOTES_API_KEY):
+        return False
+    return secrets.compare_digest(x_notes_key.encode("utf-8"), _NOTES_API_KEY_BYTES)
+
+
+# (epoch second, rendered header) for the most recent _timestamp_header call.
+# Stored as one tuple so concurrent callers never see a mismatched pair; a
+# race just renders the same string twice.
+_last_timestamp_header: Tuple[int, str] = (-1, "")
+
 
 def _timestamp_header() -> str:
     # Example: ## 2025-10-24 12:34:56 UTC
-    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-    return f"\n## {now}\n"
+    global _last_timestamp_header
+    sec = int(time.time())
+    cached_sec, header = _last_timestamp_header
+    if sec != cached_sec:
+        now = datetime.fromtimestamp(sec, timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+        header = f"\n## {now}\n"
+        _last_timestamp_header = (sec, header)
+    return header
 
 
 # Truncation indicator constants
@@ -31,7 +72,26 @@ _TRUNCATE_NEW_ENTRY = "\n...(new entry)\n"
 _TRUNCATE_ELLIPSIS = "\n...\n"
 
 
-def _truncate_content(content: str, mode: str, existing_content: Optional[str] = None, char_limit: int = 10000) -> str:
+# Maximum characters of note content returned in a response
+_CHAR_LIMIT = 10000
+# Bytes of a large note's tail fetched on append. Even at 4 bytes per character
+# this is more than _CHAR_LIMIT characters, so _truncate_content truncates the
+# tail exactly as it would the full note
+_APPEND_TAIL_BYTES = _CHAR_LIMIT * 4 + 4
+# Bytes read from each end of a large note on GET. Each range decodes to more
+# than _CHAR_LIMIT // 2 characters, so "replace" truncation of head + tail
+# matches truncation of the full note
+_HEAD_TAIL_BYTES = (_CHAR_LIMIT // 2 + 2) * 4
+
+
+def _truncate_content(
+    content: str,
+    mode: str,
+    *,
+    existing_content: Optional[str] = None,
+    split_pos: Optional[int] = None,
+    char_limit: int = _CHAR_LIMIT,
+) -> str:
     """
     Truncate content intelligently based on size and mode.
     
@@ -39,6 +99,9 @@ def _truncate_content(content: str, mode: str, existing_content: Optional[str] =
         content: The full content to potentially truncate
         mode: Either "replace" or "append"
         existing_content: The previous content (only relevant for append mode)
+        split_pos: Offset in content where the new entry starts. Callers that
+            already stripped existing_content pass its length to avoid
+            re-scanning it; defaults to len(existing_content.rstrip())
         char_limit: Maximum characters before truncation (default 10000)
     
     Returns:
@@ -52,12 +115,7 @@ def _truncate_content(content: str, mode: str, existing_content: Optional[str] =
     if mode == "replace":
         # For replace mode: first half + "..." + last half
         half_limit = char_limit // 2
-        truncated = (
-            content[:half_limit] +
-            _TRUNCATE_ELLIPSIS +
-            content[-half_limit:]
-        )
-        return truncated
+        return "".join((content[:half_limit], _TRUNCATE_ELLIPSIS, content[-half_limit:]))
     
     else:  # append mode
         # For append mode, we want to show context from both old and new content
@@ -69,48 +127,45 @@ def _truncate_content(content: str, mode: str, existing_content: Optional[str] =
         if existing_content:
             # Find where the new content starts
             # Note: existing_content was stripped before appending, so we need to account for that
-            existing_stripped = existing_content.rstrip()
+            if split_pos is None:
+                split_pos = len(existing_content.rstrip())
             # The new content includes everything after the stripped existing content
-            start_pos = len(existing_stripped)
-            new_content = content[start_pos:]
+            new_content = content[split_pos:]
             
             # Calculate limits
             existing_chars = int(char_limit * 0.2)
             new_first_chars = int(char_limit * 0.4)
             new_last_chars = int(char_limit * 0.4)
             
-            # Build truncated version
-            truncated_existing = existing_content[-existing_chars:] if existing_chars < len(existing_content) else existing_content
-            has_truncated_existing = existing_chars < len(existing_content)
-            prefix = _TRUNCATE_EXISTING if has_truncated_existing else ""
+            # Build truncated version from slices and join once at the end
+            parts = []
+            if existing_chars < len(existing_content):
+                parts.append(_TRUNCATE_EXISTING)
+                parts.append(existing_content[-existing_chars:])
+            else:
+                parts.append(existing_content)
             
             if len(new_content) <= (new_first_chars + new_last_chars):
                 # New content fits in the allocation
-                truncated = prefix + truncated_existing + new_content
+                parts.append(new_content)
             else:
                 # New content needs truncation too
-                truncated = (
-                    prefix +
-                    truncated_existing +
-                    _TRUNCATE_NEW_ENTRY +
-                    new_content[:new_first_chars] +
-                    _TRUNCATE_ELLIPSIS +
-                    new_content[-new_last_chars:]
-                )
+                parts.extend((
+                    _TRUNCATE_NEW_ENTRY,
+                    new_content[:new_first_chars],
+                    _TRUNCATE_ELLIPSIS,
+                    new_content[-new_last_chars:],
+                ))
             
-            return truncated
+            return "".join(parts)
         else:
             # No existing content, treat like replace mode
             half_limit = char_limit // 2
-            return (
-                content[:half_limit] +
-                _TRUNCATE_ELLIPSIS +
-                content[-half_limit:]
-            )
+            return "".join((content[:half_limit], _TRUNCATE_ELLIPSIS, content[-half_limit:]))
 
 
 @app.get("/ping")
-def ping() -> Dict[str, str]:
+async def ping() -> Dict[str, str]:
     """
     Public health check endpoint for monitoring and load balancer probes.
     
@@ -125,30 +180,67 @@ def ping() -> Dict[str, str]:
 
 
 @app.post("/api/v1/notes")
-def create_or_update_note(
+async def create_or_update_note(
     payload: NotePayload,
     x_notes_key: Optional[str] = Header(None),
 ) -> Dict[str, Any]:
-    if not x_notes_key or not secrets.compare_digest(x_notes_key, NOTES_API_KEY):
+    if not _auth_ok(x_notes_key):
         raise HTTPException(status_code=401, detail="unauthorized")
 
     blob_path = storage.note_path(payload.project, payload.section, payload.title)
 
     existing_content = None
-    if payload.mode == "replace" or not storage.blob_exists(blob_path):
-        new_content = f"# {payload.title}\n" + _timestamp_header() + payload.body.strip() + "\n"
-    else:
-        existing_content = storage.download_blob_text(blob_path)
-        new_content = existing_content.rstrip() + _timestamp_header() + payload.body.strip() + "\n"
+    split_pos = None
+    note_written = False
+    entry = "".join((_timestamp_header(), payload.body.strip(), "\n"))
+    if payload.mode == "append":
+        # Large notes are appended server-side and only their tail comes back;
+        # small ones come back whole. A missing note surfaces as NotFound, so
+        # no separate existence check is needed. The stored note already ends
+        # in a newline, so drop the entry's leading one.
+        try:
+            existing_content, note_written = await run_in_threadpool(
+                storage.append_blob_text, blob_path, entry.lstrip("\n"), _APPEND_TAIL_BYTES
+            )
+        except gcs_exceptions.NotFound:
+            # First entry for this note
+            pass
+        except gcs_exceptions.PreconditionFailed:
+            raise HTTPException(status_code=409, detail="note is being updated concurrently, retry")
 
-    storage.upload_blob_text(blob_path, new_content)
+    if existing_content is None:
+        new_content = "".join(("# ", payload.title, "\n", entry))
+    else:
+        existing_stripped = existing_content.rstrip()
+        split_pos = len(existing_stripped)
+        new_content = "".join((existing_stripped, entry))
 
-    # update index helpers in storage module
-    storage.ensure_index_files(payload.project, payload.section)
-    storage.update_section_index(payload.project, payload.section, payload.title)
+    # The note upload and the index updates touch different blobs, so run them
+    # concurrently rather than paying for each round-trip in turn
+    writes = [
+        run_in_threadpool(storage.update_indexes, payload.project, payload.section, payload.title),
+    ]
+    if not note_written:
+        writes.append(run_in_threadpool(storage.upload_blob_text, blob_path, new_content))
+    # Wait for both writes so a failure is reported against what actually landed
+    index_result, *note_results = await asyncio.gather(*writes, return_exceptions=True)
+    for result in note_results:
+        if isinstance(result, BaseException):
+            raise result
+    if isinstance(index_result, gcs_exceptions.PreconditionFailed):
+        # Index retries exhausted under sustained concurrent writes. The note
+        # itself is already stored, so resending it would duplicate an append.
+        raise HTTPException(
+            status_code=409,
+            detail="note saved, but its index is being updated concurrently; do not resend the note",
+        )
+    if isinstance(index_result, BaseException):
+        raise index_result
 
     # Truncate content for response if needed
-    response_content = _truncate_content(new_content, payload.mode, existing_content)
+    response_content = _truncate_content(
+        new_content, payload.mode, existing_content=existing_content, split_pos=split_pos
+    )
 
     return {
         "status": "ok",
@@ -158,22 +250,24 @@ def create_or_update_note(
 
 
 @app.get("/api/v1/notes")
-def get_note(
+async def get_note(
     project: str = Query(...),
     section: str = Query(...),
     title: str = Query(...),
     x_notes_key: Optional[str] = Header(None),
 ) -> Dict[str, Any]:
-    if not x_notes_key or not secrets.compare_digest(x_notes_key, NOTES_API_KEY):
+    if not _auth_ok(x_notes_key):
         raise HTTPException(status_code=401, detail="unauthorized")
 
     blob_path = storage.note_path(project, section, title)
-    if not storage.blob_exists(blob_path):
+    # Fetch only as much of the note as the response can show; a missing note
+    # raises NotFound from the same request instead of needing a HEAD first
+    try:
+        head, tail = await run_in_threadpool(storage.download_blob_head_tail, blob_path, _HEAD_TAIL_BYTES)
+    except gcs_exceptions.NotFound:
         raise HTTPException(status_code=404, detail="note not found")
-
-    content = storage.download_blob_text(blob_path)
     # Truncate content for response if needed (use "replace" mode for GET)
-    response_content = _truncate_content(content, "replace")
+    response_content = _truncate_content(head + tail, "replace")
 
     return {
         "status": "ok",
@@ -182,15 +276,53 @@ def get_note(
     }
 
 
+# Serialized /api/v1/index response: (tree it was built from, ETag, JSON bytes,
+# gzipped JSON bytes or None when below the compression threshold).
+# storage.list_tree returns the same list object until the tree changes, so an
+# identity check is enough to know the cached body is still current.
+_index_response_cache: Optional[Tuple[List[Dict[str, Any]], str, bytes, Optional[bytes]]] = None
+
+
+def _index_response(projects_out: List[Dict[str, Any]]) -> Tuple[str, bytes, Optional[bytes]]:
+    global _index_response_cache
+    cached = _index_response_cache
+    if cached is not None and cached[0] is projects_out:
+        return cached[1], cached[2], cached[3]
+
+    body = orjson.dumps({"status": "ok", "projects": projects_out})
+    etag = f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    # Compressed once per tree change, so a higher level than the middleware's
+    # per-response level is affordable here
+    gzipped = gzip.compress(body, compresslevel=6) if len(body) >= _GZIP_MINIMUM_SIZE else None
+    _index_response_cache = (projects_out, etag, body, gzipped)
+    return etag, body, gzipped
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison: W/"x" and "x" refer to the same representation
+    opaque = etag.removeprefix("W/")
+    return "*" in candidates or any(tag.removeprefix("W/") == opaque for tag in candidates)
+
+
 @app.get("/api/v1/index")
-def get_index(
+async def get_index(
     x_notes_key: Optional[str] = Header(None),
-) -> Dict[str, Any]:
-    if not x_notes_key or not secrets.compare_digest(x_notes_key, NOTES_API_KEY):
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+) -> Response:
+    if not _auth_ok(x_notes_key):
         raise HTTPException(status_code=401, detail="unauthorized")
 
-    projects_out = storage.list_tree(prefix="notes/")
-    return {
-        "status": "ok",
-        "projects": projects_out,
-    }
+    projects_out = await run_in_threadpool(storage.list_tree, prefix=storage.NOTES_PREFIX)
+    etag, body, gzipped = _index_response(projects_out)
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if gzipped is not None and accept_encoding and "gzip" in accept_encoding:
+        # Already compressed; GZipMiddleware passes encoded responses through
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=gzipped, media_type="application/json", headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,6 +1,10 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Literal
 class NotePayload(BaseModel):
+    # Reject unknown fields and make instances immutable; the payload is never
+    # modified after validation
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
     project: str
     section: str
     title: str
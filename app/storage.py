@@ -1,17 +1,68 @@
 import os
+import random
 import time
-import re
-from typing import Any, Dict, List
+import threading
+import codecs
+import logging
+import uuid
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Set, Tuple
 from google.cloud import storage
 from google.api_core import exceptions
+from google.api_core.client_info import ClientInfo
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
 
 BUCKET_NAME = os.environ.get("NOTES_BUCKET")
 if not BUCKET_NAME:
     raise RuntimeError("NOTES_BUCKET env var missing")
 
-client = storage.Client()
+# Object prefix every note and index lives under
+NOTES_PREFIX = "notes/"
+
+# Number of worker threads issuing parallel GCS calls
+GCS_POOL_SIZE = int(os.environ.get("NOTES_GCS_POOL_SIZE", "16"))
+# Keep-alive connections shared by all GCS calls. Request handlers call storage
+# through run_in_threadpool (anyio's worker threads, 40 by default) and fan out
+# further calls on _GCS_POOL, so this is sized for both rather than for
+# _GCS_POOL alone
+GCS_HTTP_POOL_SIZE = int(os.environ.get("NOTES_GCS_HTTP_POOL_SIZE", "64"))
+
+# Identifies this service's traffic in GCS request logs and audit entries
+_USER_AGENT = "personal-notes-api"
+
+client = storage.Client(client_info=ClientInfo(user_agent=_USER_AGENT))
+# Transport-level retries cover dropped or reset connections only, with a short
+# backoff. HTTP 429/5xx responses are left to the library's own
+# per-call retry policy, which knows which requests are safe to repeat;
+# retrying statuses here as well would multiply the attempts.
+_TRANSPORT_RETRY = Retry(total=3, status=0, backoff_factor=0.2)
+# Mount a larger pooled adapter on the client's AuthorizedSession so concurrent
+# requests reuse warm TLS connections instead of opening new ones
+_adapter = HTTPAdapter(
+    pool_connections=GCS_POOL_SIZE, pool_maxsize=GCS_HTTP_POOL_SIZE, max_retries=_TRANSPORT_RETRY
+)
+client._http.mount("https://", _adapter)
 bucket = client.bucket(BUCKET_NAME)
 
+# Shared worker pool for issuing independent GCS calls in parallel. Tasks run
+# on it must not themselves wait on other tasks submitted to it.
+_GCS_POOL = ThreadPoolExecutor(max_workers=GCS_POOL_SIZE, thread_name_prefix="gcs")
+
+# Single translation table for sanitize: deletes control characters (ASCII
+# 0-31 and 127) and maps path separators and other problematic characters
+# (/ \ : * ? " < > | and dots) to underscores
+_SANITIZE_TRANSLATE = {
+    **dict.fromkeys([*range(32), 127]),
+    **{ord(char): "_" for char in '/\\:*?"<>|.'},
+}
+
+@lru_cache(maxsize=4096)
 def sanitize(segment: str) -> str:
     r"""
     Sanitize a segment for use in GCS object paths.
@@ -24,49 +75,169 @@ def sanitize(segment: str) -> str:
     
     This prevents path traversal attacks and unexpected storage behavior.
     """
-    # First, strip leading/trailing whitespace
-    segment = segment.strip()
-    
-    # Replace internal whitespace with underscores
+    # Strip leading/trailing whitespace and replace internal whitespace runs
+    # with underscores (split() with no argument does both)
     segment = "_".join(segment.split())
     
-    # Remove control characters (ASCII 0-31 and 127)
-    segment = "".join(char for char in segment if ord(char) >= 32 and ord(char) != 127)
-    
-    # Replace path separators and other problematic characters with underscores
-    # This includes: / \ : * ? " < > | and dots (to prevent hidden files and path traversal)
-    problematic_chars = r'[/\\:*?"<>|\.]'
-    segment = re.sub(problematic_chars, "_", segment)
+    # Remove control characters and replace path separators, dots (to prevent
+    # hidden files and path traversal) and other problematic characters with
+    # underscores in one pass
+    segment = segment.translate(_SANITIZE_TRANSLATE)
     
     # Remove leading/trailing underscores that may result from sanitization
-    segment = segment.strip("_")
-    
     # If the segment is empty after sanitization, return a safe default
-    if not segment:
-        segment = "unnamed"
-    
-    return segment
+    return segment.strip("_") or "unnamed"
 
+@lru_cache(maxsize=2048)
 def note_path(project: str, section: str, title: str) -> str:
-    return f"notes/{sanitize(project)}/{sanitize(section)}/{sanitize(title)}.md"
+    return f"{NOTES_PREFIX}{sanitize(project)}/{sanitize(section)}/{sanitize(title)}.md"
 
-def blob_exists(path: str) -> bool:
-    return bucket.blob(path).exists()
+@lru_cache(maxsize=2048)
+def _blob(path: str) -> storage.Blob:
+    """
+    Shared Blob handle for ``path``, saving a Blob construction per call.
 
-def download_blob_text(path: str) -> str:
-    blob = bucket.blob(path)
-    return blob.download_as_text()
+    Only use it for plain uploads. Blob keeps generation/checksums in mutable
+    properties that every request updates, and a handle that has downloaded
+    pins later downloads to that generation, so reads, compose and anything
+    that reads metadata back must build their own handle with ``bucket.blob``.
+    """
+    return bucket.blob(path)
+
+# UTF-8 continuation bytes, left dangling when a ranged read starts mid-character
+_UTF8_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+
+def _decode_utf8_range(data: bytes) -> str:
+    """Decode a byte range that may start or end in the middle of a character."""
+    data = data.lstrip(_UTF8_CONTINUATION_BYTES)
+    # A non-final incremental decode drops an incomplete trailing sequence
+    return codecs.getincrementaldecoder("utf-8")().decode(data, final=False)
+
+def download_blob_head_tail(path: str, n: int) -> Tuple[str, str]:
+    """
+    Download only the first and last ``n`` bytes of a blob.
+
+    Returns ``(head, tail)``. When the blob is no larger than ``2 * n`` the
+    whole text is returned as ``head`` and ``tail`` is empty; otherwise the
+    two ranges are decoded independently, so callers must not treat
+    ``head + tail`` as the full content.
+    """
+    def _download():
+        blob = bucket.blob(path)
+        # One ranged read both fetches the head and tells whether the blob is
+        # small enough to be returned whole (a short read), so no metadata
+        # reload is needed first. The response's generation pins the tail read.
+        try:
+            data = blob.download_as_bytes(start=0, end=2 * n)
+        except exceptions.RequestRangeNotSatisfiable:
+            # Empty object: a byte range has nothing to return
+            return "", ""
+        if len(data) <= 2 * n:
+            return data.decode("utf-8"), ""
+
+        tail = blob.download_as_bytes(start=-n, if_generation_match=blob.generation)
+        return _decode_utf8_range(data[:n]), _decode_utf8_range(tail)
+
+    return _retry_on_conflict(_download)
 
 def upload_blob_text(path: str, content: str) -> None:
-    blob = bucket.blob(path)
+    blob = _blob(path)
     blob.upload_from_string(content)
+    if path.startswith(NOTES_PREFIX):
+        invalidate_tree_cache()
+
+# Staging objects for compose appends. A bucket lifecycle rule on _tmp/ reaps
+# any that cleanup misses (see terraform/main.tf)
+_APPEND_STAGING_PREFIX = "_tmp/appends/"
+
+# Content type notes and indexes are uploaded with (upload_from_string's default)
+_TEXT_CONTENT_TYPE = "text/plain"
+
+def _compose_target(path: str) -> storage.Blob:
+    """
+    Fresh destination handle for composing onto ``path``.
+
+    Blob.compose sends the handle's properties as the destination resource. A
+    handle that has downloaded carries the old object's crc32c/md5Hash, which
+    GCS would check against the composed data and reject, so only the content
+    type is set. Callers pin the version with ``if_generation_match``.
+    """
+    target = bucket.blob(path)
+    target.content_type = _TEXT_CONTENT_TYPE
+    return target
+
+def _delete_staging(staging) -> None:
+    """
+    Best-effort removal of a compose staging object.
+
+    Never raises: by the time this runs the compose has either committed or
+    failed with its own error, and a cleanup failure must not mask either.
+    """
+    try:
+        staging.delete()
+    except exceptions.NotFound:
+        pass
+    except (exceptions.GoogleAPICallError, requests.exceptions.RequestException):
+        logger.warning("Failed to delete staging object %s", staging.name, exc_info=True)
+
+def append_blob_text(path: str, entry: str, tail_bytes: int) -> Tuple[str, bool]:
+    """
+    Append ``entry`` to an existing blob, reading at most its last ``tail_bytes``.
+
+    Returns ``(previous, appended)``. A single ranged read fetches the tail of
+    the blob. If that turns out to be the whole object, nothing is written and
+    ``(previous_text, False)`` is returned for the caller to append in memory
+    and upload. Larger blobs get the entry staged in a temporary object and
+    concatenated on with a generation-guarded compose, returning
+    ``(decoded_tail, True)``. A large blob that doesn't end in exactly one
+    newline is downloaded in full instead, since compose cannot trim
+    whitespace. Raises NotFound if the blob does not exist.
+    """
+    staging = bucket.blob(f"{_APPEND_STAGING_PREFIX}{uuid.uuid4().hex}")
+    staged = False
+
+    def _append():
+        nonlocal staged
+        # Fresh handle per attempt: after a download the handle pins later
+        # reads to that generation, so a retry would re-read the version that
+        # lost the race (or get NotFound once it is gone)
+        blob = bucket.blob(path)
+        try:
+            data = blob.download_as_bytes(start=-tail_bytes)
+        except exceptions.RequestRangeNotSatisfiable:
+            # Empty object: a suffix range has nothing to return
+            data = b""
+        generation = blob.generation
+        if len(data) < tail_bytes:
+            return data.decode("utf-8"), False
+
+        tail = _decode_utf8_range(data)
+        if tail.rstrip() + "\n" != tail:
+            return blob.download_as_text(), False
+
+        staging.upload_from_string(entry)
+        staged = True
+        target = _compose_target(path)
+        target.compose([blob, staging], if_generation_match=generation)
+        return tail, True
+
+    try:
+        result = _retry_on_conflict(_append)
+    finally:
+        if staged:
+            _delete_staging(staging)
+
+    return result
 
 # Index helpers moved here so main can remain simple
+@lru_cache(maxsize=2048)
 def _index_path(project: str, section: str | None = None) -> str:
     if section is None:
-        return f"notes/{sanitize(project)}/_index.md"
+        return f"{NOTES_PREFIX}{sanitize(project)}/_index.md"
     else:
-        return f"notes/{sanitize(project)}/{sanitize(section)}/_index.md"
+        return f"{NOTES_PREFIX}{sanitize(project)}/{sanitize(section)}/_index.md"
+
+_RETRY_MAX_SLEEP_SECONDS = 2.0
 
 def _retry_on_conflict(func, max_retries: int = 5):
     """Retry a function that may encounter precondition failures due to concurrent updates."""
@@ -80,135 +251,272 @@ def _retry_on_conflict(func, max_retries: int = 5):
         except exceptions.PreconditionFailed:
             if attempt == max_retries - 1:
                 raise
-            # Exponential backoff: 0.1s, 0.2s, 0.4s, 0.8s
-            time.sleep(0.1 * (2 ** attempt))
+            # Exponential backoff with full jitter (0.1s, 0.2s, 0.4s, 0.8s ceilings,
+            # capped) so concurrent writers retrying the same index don't
+            # wake up in lockstep and collide again. The final failure is
+            # re-raised for the API layer to report as a conflict
+            time.sleep(random.uniform(0, min(_RETRY_MAX_SLEEP_SECONDS, 0.1 * (2 ** attempt))))
     
     # This line should never be reached due to the return or raise in the loop
     # but added for clarity and to satisfy linters
     return None
 
-def ensure_index_files(project: str, section: str) -> None:
-    """Ensure project and section index files exist with atomic operations to prevent race conditions."""
-    
-    # Update project-level index
-    def _update_project_index():
-        project_path = _index_path(project)
-        blob = bucket.blob(project_path)
-        
-        # Try to create first - this will fail if blob already exists
-        try:
-            blob.upload_from_string(
-                f"# {project}\n\nSections:\n- [[{section}]]\n",
-                if_generation_match=0
-            )
-            return  # Successfully created, we're done
-        except exceptions.PreconditionFailed:
-            # Blob already exists, need to update it
-            pass
-        
-        # Blob exists, reload metadata to capture current generation before downloading
-        blob.reload()
-        generation = blob.generation
-        if generation is None:
-            raise exceptions.PreconditionFailed("Failed to retrieve blob generation for atomic update. The blob may have been deleted.")
+# In-process cache of what each index blob is known to contain:
+# (set of lines, generation, length in characters). The generation is only
+# kept for a canonical copy - no surrounding whitespace beyond one trailing
+# newline - which a link can be composed onto directly; otherwise it is None.
+# This service only ever adds links, so a cached link means the index is up to
+# date and both the download and the upload can be skipped. Entries expire so
+# that changes made outside this process (an index deleted, or a link removed
+# by hand) are repaired by the next save after at most the max age.
+INDEX_CACHE_TTL_SECONDS = float(os.environ.get("NOTES_INDEX_CACHE_TTL", "60"))
+_INDEX_LINKS_CACHE_SIZE = 1024
+_index_links_cache: "OrderedDict[str, Tuple[float, Set[str], Optional[int], int]]" = OrderedDict()
+_index_links_lock = threading.Lock()
 
-        current = blob.download_as_text(if_generation_match=generation)
-        link_line = f"- [[{section}]]"
+def _cached_index(path: str) -> Optional[Tuple[Set[str], Optional[int], int]]:
+    with _index_links_lock:
+        entry = _index_links_cache.get(path)
+        if entry is None:
+            return None
+        stored_at, lines, generation, length = entry
+        if time.monotonic() - stored_at >= INDEX_CACHE_TTL_SECONDS:
+            del _index_links_cache[path]
+            return None
+        _index_links_cache.move_to_end(path)
+        return lines, generation, length
 
-        if link_line in current:
-            # Already present, nothing to do
-            return
-        
-        # Update content and upload only if generation hasn't changed
-        new_content = current.strip() + "\n" + link_line + "\n"
-        blob.upload_from_string(new_content, if_generation_match=generation)
-    
-    _retry_on_conflict(_update_project_index)
-    
-    # Create section-level index if it doesn't exist
-    section_path = _index_path(project, section)
-    blob = bucket.blob(section_path)
-    
-    # Try to create - if it fails, blob already exists (which is fine)
+def _remember_index_links(path: str, lines: Set[str], generation: Optional[int], length: int) -> None:
+    with _index_links_lock:
+        _index_links_cache[path] = (time.monotonic(), lines, generation, length)
+        _index_links_cache.move_to_end(path)
+        while len(_index_links_cache) > _INDEX_LINKS_CACHE_SIZE:
+            _index_links_cache.popitem(last=False)
+
+def _forget_index_links(path: str) -> None:
+    with _index_links_lock:
+        _index_links_cache.pop(path, None)
+
+# Index writes are small and always generation-guarded, so skip the client-side
+# checksum the library would otherwise compute over every rewrite
+_INDEX_UPLOAD_CHECKSUM = None
+
+def _upload_index(blob, path: str, content: str, lines: Set[str], **kwargs) -> None:
+    """
+    Upload an index blob, caching ``lines`` (the lines of ``content``) on success.
+
+    ``content`` must be canonical, as _format_index and _append_index_link
+    produce it.
+    """
     try:
-        blob.upload_from_string(
-            f"# {section}\n\nNotes in this section:\n",
-            if_generation_match=0
+        blob.upload_from_string(content, checksum=_INDEX_UPLOAD_CHECKSUM, **kwargs)
+    except exceptions.GoogleAPICallError:
+        _forget_index_links(path)
+        raise
+    _remember_index_links(path, lines, blob.generation, len(content))
+
+# Below this size, rewriting the whole index (download + upload) is cheaper
+# than the staging upload, compose and cleanup an append by compose costs
+_INDEX_COMPOSE_MIN_CHARS = 64 * 1024
+
+def _compose_index_link(
+    path: str, lines: Set[str], generation: int, length: int, link_line: str
+) -> None:
+    """
+    Append ``link_line`` to a large index server-side, without downloading it.
+
+    ``generation`` pins the compose to the cached copy ``lines`` describes, so
+    an index changed elsewhere fails with PreconditionFailed (and is dropped
+    from the cache) instead of gaining a duplicate link.
+    """
+    staging = bucket.blob(f"{_APPEND_STAGING_PREFIX}{uuid.uuid4().hex}")
+    staging.upload_from_string(f"{link_line}\n", checksum=_INDEX_UPLOAD_CHECKSUM)
+    target = _compose_target(path)
+    try:
+        target.compose(
+            [bucket.blob(path, generation=generation), staging], if_generation_match=generation
         )
-    except exceptions.PreconditionFailed:
-        # Blob already exists from another process, no action needed
-        pass
+    except exceptions.GoogleAPICallError:
+        _forget_index_links(path)
+        raise
+    finally:
+        _delete_staging(staging)
+    _remember_index_links(path, lines | {link_line}, target.generation, length + len(link_line) + 1)
 
-def update_section_index(project: str, section: str, title: str) -> None:
-    """Update section index with atomic operations to prevent race conditions."""
-    path = _index_path(project, section)
+# Index file layout: "# <name>", a blank line, a marker line, then one link
+# line per child. Project indexes link sections, section indexes link notes.
+_PROJECT_INDEX_MARKER = "Sections:"
+_SECTION_INDEX_MARKER = "Notes in this section:"
+
+def _link_line(name: str) -> str:
+    return f"- [[{name}]]"
+
+def _format_index(title: str, marker: str, names: tuple[str, ...] = ()) -> str:
+    """Render a new index file in its canonical form."""
+    return "".join((f"# {title}\n\n{marker}\n", *(f"{_link_line(name)}\n" for name in names)))
+
+def _parse_index(text: str) -> Set[str]:
+    """Split an index file into its set of lines, for O(1) link membership checks."""
+    return set(text.splitlines())
+
+def _append_index_link(current: str, link_line: str) -> str:
+    """Append a link line to an existing index, preserving any hand edits above it."""
+    return f"{current.strip()}\n{link_line}\n"
+
+def _add_index_link(path: str, title: str, marker: str, name: str) -> None:
+    """
+    Add a ``name`` link to the index at ``path``, creating the index if needed.
+
+    Retries on concurrent updates; ``title`` and ``marker`` only shape a newly
+    created index.
+    """
+    link_line = _link_line(name)
     
     def _update():
+        # Fresh handle per attempt: once a handle has downloaded, it pins
+        # later reads to that generation, so a retry would re-read the version
+        # that just lost the race
         blob = bucket.blob(path)
+        cached = _cached_index(path)
+        if cached is not None:
+            lines, generation, length = cached
+            if link_line in lines:
+                return
+            if generation is not None and length >= _INDEX_COMPOSE_MIN_CHARS:
+                _compose_index_link(path, lines, generation, length, link_line)
+                return
         
-        # Try to create first - this will fail if blob already exists
+        # Indexes almost always exist already, so read first: the download
+        # response carries the generation it was served from
+        # (x-goog-generation), which guards the upload below
         try:
-            blob.upload_from_string(
-                f"# {section}\n\nNotes in this section:\n- [[{title}]]\n",
+            current = blob.download_as_text()
+        except exceptions.NotFound:
+            # First link for this index. If another writer creates it first,
+            # the PreconditionFailed retries and takes the download path
+            content = _format_index(title, marker, (name,))
+            _upload_index(
+                blob,
+                path,
+                content,
+                _parse_index(content),
                 if_generation_match=0
             )
-            return  # Successfully created, we're done
-        except exceptions.PreconditionFailed:
-            # Blob already exists, need to update it
-            pass
-        
-        # Blob exists, reload metadata to capture current generation before downloading
-        blob.reload()
+            return
         generation = blob.generation
         if generation is None:
             raise exceptions.PreconditionFailed("Failed to retrieve blob generation for atomic update. The blob may have been deleted.")
+        lines = _parse_index(current)
+        canonical = current.strip() + "\n" == current
+        _remember_index_links(path, lines, generation if canonical else None, len(current))
 
-        current = blob.download_as_text(if_generation_match=generation)
-        link_line = f"- [[{title}]]"
-
-        if link_line in current.splitlines():
+        if link_line in lines:
             # Already present, nothing to do
             return
         
         # Update content and upload only if generation hasn't changed
-        new_content = current.strip() + "\n" + link_line + "\n"
-        blob.upload_from_string(new_content, if_generation_match=generation)
+        new_content = _append_index_link(current, link_line)
+        _upload_index(blob, path, new_content, lines | {link_line}, if_generation_match=generation)
     
     _retry_on_conflict(_update)
 
-def list_tree(prefix: str = "notes/") -> List[Dict[str, Any]]:
-    # Walk the bucket under the given prefix and return the same nested structure
-    blobs = bucket.list_blobs(prefix=prefix)
-    tree = {}
+def _update_project_index(project: str, section: str) -> None:
+    """Add a section link to the project index."""
+    _add_index_link(_index_path(project), project, _PROJECT_INDEX_MARKER, section)
 
-    for b in blobs:
-        if b.name.endswith("/"):
-            continue
-        parts = b.name.split("/")
+def update_section_index(project: str, section: str, title: str) -> None:
+    """Update section index with atomic operations to prevent race conditions."""
+    _add_index_link(_index_path(project, section), section, _SECTION_INDEX_MARKER, title)
+
+def update_indexes(project: str, section: str, title: str) -> None:
+    """
+    Link a note into its section index and the section into its project index.
+
+    The two index blobs are updated concurrently, and a missing section index
+    is created directly with the note's link rather than first as an empty file.
+    """
+    project_update = _GCS_POOL.submit(_update_project_index, project, section)
+    update_section_index(project, section, title)
+    project_update.result()
+
+# Cache of list_tree results keyed by prefix. Local note writes invalidate it
+# immediately; the max age bounds staleness from writes made by other instances.
+TREE_CACHE_TTL_SECONDS = float(os.environ.get("NOTES_TREE_CACHE_TTL", "30"))
+_tree_cache: Dict[str, tuple[float, List[Dict[str, Any]]]] = {}
+_tree_generation = 0
+_tree_lock = threading.Lock()
+
+def invalidate_tree_cache() -> None:
+    """Drop cached list_tree results after a write under notes/."""
+    global _tree_generation
+    with _tree_lock:
+        _tree_generation += 1
+        _tree_cache.clear()
+
+def list_tree(prefix: str = NOTES_PREFIX) -> List[Dict[str, Any]]:
+    """
+    Return the project/section/note tree under ``prefix``.
+
+    Results are served from an in-process cache between writes; callers must
+    treat the returned structure as read-only.
+    """
+    with _tree_lock:
+        generation = _tree_generation
+        cached = _tree_cache.get(prefix)
+    if cached is not None and time.monotonic() - cached[0] < TREE_CACHE_TTL_SECONDS:
+        return cached[1]
+
+    projects_out = _build_tree(prefix)
+
+    with _tree_lock:
+        # Only cache if no write landed while we were listing
+        if generation == _tree_generation:
+            _tree_cache[prefix] = (time.monotonic(), projects_out)
+    return projects_out
+
+def _list_names(prefix: str, delimiter: str | None = None) -> Tuple[List[str], Set[str]]:
+    """List object names under ``prefix``, plus sub-prefixes when ``delimiter`` is set."""
+    # Only names are used, so ask for a partial response instead of full
+    # per-object metadata (the JSON API's "fields" selector)
+    fields = "items(name),prefixes,nextPageToken" if delimiter else "items(name),nextPageToken"
+    blobs = bucket.list_blobs(prefix=prefix, delimiter=delimiter, fields=fields)
+    # prefixes is only populated once the pages have been consumed
+    names = [b.name for b in blobs]
+    return names, set(blobs.prefixes)
+
+def _build_tree(prefix: str) -> List[Dict[str, Any]]:
+    # Walk the bucket under the given prefix and return the same nested structure.
+    # One delimited listing finds the project prefixes; the projects are then
+    # listed in parallel instead of paging through the whole bucket serially.
+    _, project_prefixes = _list_names(prefix, delimiter="/")
+    listings = _GCS_POOL.map(lambda p: _list_names(p)[0], sorted(project_prefixes))
+    # project -> section -> set of titles; sets make de-duplication O(1)
+    tree: Dict[str, Dict[str, Set[str]]] = defaultdict(lambda: defaultdict(set))
+
+    for name in (name for names in listings for name in names):
+        # notes/<project>/<section>/<file>; maxsplit bounds the work on deeper
+        # names, which split into 5 parts and are skipped like any other miss
+        parts = name.split("/", 4)
         if len(parts) != 4:
             continue
         _, project, section, filename = parts
-        if filename == "_index.md":
+        # Folder placeholders ("notes/p/s/") split to an empty filename
+        if not filename or filename == "_index.md":
             continue
         title = filename[:-3] if filename.endswith(".md") else filename
+        tree[project][section].add(title)
 
-        proj = tree.setdefault(project, {})
-        sec = proj.setdefault(section, [])
-        if title not in sec:
-            sec.append(title)
-
+    # Materialize to sorted lists once, after de-duplication. Sorting
+    # (lowercase name, name) tuples orders case-insensitively without a Python
+    # key callback; names are unique, so comparison never reaches a later field.
     projects_out = []
-    for project, sections in tree.items():
-        sections_out = []
-        for section, notes in sections.items():
-            sections_out.append({
-                "name": section,
-                "notes": sorted(notes),
-            })
+    for _, project, sections in sorted((p.lower(), p, s) for p, s in tree.items()):
+        section_keys = sorted((section.lower(), section) for section in sections)
         projects_out.append({
             "name": project,
-            "sections": sorted(sections_out, key=lambda s: s["name"].lower()),
+            "sections": [
+                {"name": section, "notes": sorted(sections[section])}
+                for _, section in section_keys
+            ],
         })
-
-    projects_out = sorted(projects_out, key=lambda p: p["name"].lower())
     return projects_out
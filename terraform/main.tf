@@ -45,6 +45,31 @@ resource "google_storage_bucket" "notes_bucket" {
     enabled = true
   }
 
+  # _tmp/ holds short-lived compose staging objects. Reap any left behind by a
+  # crash or a failed cleanup, and drop their noncurrent versions so deleted
+  # staging objects don't accumulate under versioning.
+  lifecycle_rule {
+    condition {
+      age            = 1
+      matches_prefix = ["_tmp/"]
+      with_state     = "LIVE"
+    }
+    action {
+      type = "Delete"
+    }
+  }
+
+  lifecycle_rule {
+    condition {
+      days_since_noncurrent_time = 1
+      matches_prefix             = ["_tmp/"]
+      with_state                 = "ARCHIVED"
+    }
+    action {
+      type = "Delete"
+    }
+  }
+
   depends_on = [google_project_service.storage_api]
 }
 
@@ -21,9 +21,14 @@ variable "service_name" {
 }
 
 variable "api_key" {
-  description = "Shared secret for X-Notes-Key auth"
+  description = "Shared secret for X-Notes-Key auth (at least 32 characters)"
   type        = string
   sensitive   = true
+
+  validation {
+    condition     = length(var.api_key) >= 32
+    error_message = "api_key must be at least 32 characters (e.g. openssl rand -hex 32)."
+  }
 }
 
 variable "container_image" {